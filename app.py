@@ -1,9 +1,10 @@
 # app.py
 import streamlit as st
 import folium
-from streamlit_folium import folium_static
+import streamlit.components.v1 as components
 from folium.plugins import Fullscreen
 import numpy as np
+import shapely
 from shapely.validation import make_valid
 from datetime import datetime
 import plotly.express as px
@@ -17,12 +18,16 @@ def _geom_to_coords(geom, inv):
     if geom.is_empty or not geom.is_valid:
         return []
     if geom.geom_type == 'Polygon':
-        return [inv.transform(x, y) for x, y in geom.exterior.coords]
-    if geom.geom_type == 'MultiPolygon' and len(geom.geoms) > 0:
-        return [inv.transform(x, y) for x, y in geom.geoms[0].exterior.coords]
-    if geom.geom_type == 'LineString':
-        return [inv.transform(x, y) for x, y in geom.coords]
-    return []
+        xy = np.asarray(geom.exterior.coords)
+    elif geom.geom_type == 'MultiPolygon' and len(geom.geoms) > 0:
+        xy = np.asarray(geom.geoms[0].exterior.coords)
+    elif geom.geom_type == 'LineString':
+        xy = np.asarray(geom.coords)
+    else:
+        return []
+    # One PROJ call per geometry instead of one per vertex
+    lons, lats = inv.transform(xy[:, 0], xy[:, 1])
+    return list(zip(lons.tolist(), lats.tolist()))
 
 
 # ================================
@@ -47,6 +52,12 @@ except:
 # ================================
 # FETCH OSM DATA
 # ================================
+# Cached per (lat, lng, radius) so reruns that only touch UI state skip Overpass,
+# reprojection and clipping. Shapely geometries and pyproj transformers both pickle.
+@st.cache_data(ttl=3600, show_spinner=False)
+def _fetch_features(lat: float, lng: float, radius: int):
+    return get_congestion_features(lat, lng, radius)
+
 with st.spinner("Fetching OpenStreetMap data..."):
     (metrics,
      buildings_with_type,
@@ -54,7 +65,7 @@ with st.spinner("Fetching OpenStreetMap data..."):
      buf,
      fwd,
      inv,
-     water_polygons) = get_congestion_features(lat, lng, radius)
+     water_polygons) = _fetch_features(lat, lng, radius)
 
 
 # ================================
@@ -86,7 +97,8 @@ level = "HIGH" if congestion_score > 7 else "MEDIUM" if congestion_score > 4 els
 # BUILDING COLORS & TOP 10
 # ================================
 type_areas = metrics["building_types_area"]
-top_tags = [tag for tag, _ in sorted(type_areas.items(), key=lambda x: x[1], reverse=True)[:10]]
+sorted_types = sorted(type_areas.items(), key=lambda x: x[1], reverse=True)  # reused by the Top 10 report
+top_tags = [tag for tag, _ in sorted_types[:10]]
 
 fixed_colors = {
     "building=house": "#d32f2f", "building=yes": "#1976d2", "building=apartments": "#388e3c",
@@ -122,158 +134,184 @@ fig_land = px.pie(
 # ================================
 # MAP - CLEAN & BEAUTIFUL
 # ================================
-m = folium.Map(location=[lat, lng], zoom_start=16, tiles=None)
-
-# Satellite + dark overlay
-folium.TileLayer('https://server.arcgisonline.com/ArcGIS/rest/services/World_Imagery/MapServer/tile/{z}/{y}/{x}',
-                 attr='Esri', name='Satellite', show=True).add_to(m)
-folium.TileLayer('https://{s}.basemaps.cartocdn.com/dark_all/{z}/{x}/{y}{r}.png',
-                 attr='CartoDB', name='Contrast', overlay=True, opacity=0.35, subdomains='abcd').add_to(m)
-folium.TileLayer('OpenStreetMap', name='OpenStreetMap', show=False).add_to(m)
-
-Fullscreen(position="topleft").add_to(m)
-folium.plugins.MousePosition(separator=' | ', prefix='Lat/Lng: ', num_digits=6).add_to(m)
-
-folium.Circle([lat, lng], radius=radius, color="#00ff00", weight=10, fillOpacity=0.15, opacity=1,
-              tooltip="Analysis Zone").add_to(m)
-
-# Buildings
-folium.GeoJson(
-    {"type": "FeatureCollection", "features": [
-        {"type": "Feature", "geometry": {"type": "Polygon", "coordinates": [_geom_to_coords(geom, inv)]},
-         "properties": {"name": btype.replace("building=", "").title().replace("Yes", "Generic Building"),
-                        "area": f"{geom.area:,.0f}", "tag": btype}}
-        for geom, btype in buildings_with_type
-        if geom.is_valid and geom.area >= 20 and len(_geom_to_coords(geom, inv)) >= 3
-    ]},
-    style_function=lambda x: {
-        "fillColor": tag_to_color.get(x["properties"]["tag"] if x["properties"]["tag"] in top_tags else "Other", "#95a5a6"),
-        "color": "#2c3e50", "weight": 1.3, "fillOpacity": 0.85
-    },
-    tooltip=folium.GeoJsonTooltip(["name", "area"], aliases=["Type:", "Area (m²):"])
-).add_to(m)
-
-# Water Bodies
-if water_polygons:
-    water_geojson = {
-        "type": "FeatureCollection",
-        "features": [{
+DISPLAY_TOLERANCE_M = 0.5  # metres, map geometry simplification only
+
+# The rendered HTML is cached: reruns with the same inputs (legend/UI-only changes)
+# reuse it instead of re-serializing every GeoJSON feature. metrics acts as a content
+# checksum of the fetched data; the underscore-prefixed geometry arguments are not hashed.
+@st.cache_data(ttl=3600, show_spinner=False)
+def _render_map_html(lat, lng, radius, metrics, top_tags, tag_to_color, _buildings, _roads, _waters, _inv):
+    m = folium.Map(location=[lat, lng], zoom_start=16, tiles=None)
+
+    # Satellite, dimmed with a CSS filter instead of a second (CartoDB dark) tile layer at 35% opacity
+    folium.TileLayer('https://server.arcgisonline.com/ArcGIS/rest/services/World_Imagery/MapServer/tile/{z}/{y}/{x}',
+                     attr='Esri', name='Satellite', show=True, class_name='satellite-dim').add_to(m)
+    m.get_root().header.add_child(folium.Element(
+        "<style>.satellite-dim { filter: brightness(0.65) saturate(0.9); }</style>"))
+    folium.TileLayer('OpenStreetMap', name='OpenStreetMap', show=False).add_to(m)
+
+    Fullscreen(position="topleft").add_to(m)
+    folium.plugins.MousePosition(separator=' | ', prefix='Lat/Lng: ', num_digits=6).add_to(m)
+
+    folium.Circle([lat, lng], radius=radius, color="#00ff00", weight=10, fillOpacity=0.15, opacity=1,
+                  tooltip="Analysis Zone").add_to(m)
+
+    # Display-only copies simplified to 0.5 m (UTM metres, far below a pixel at zoom 16);
+    # areas and lengths shown on the map still come from the exact geometries
+    buildings_display = shapely.simplify(np.array([g for g, _ in _buildings], dtype=object), DISPLAY_TOLERANCE_M)
+    water_display = shapely.simplify(np.array(_waters, dtype=object), DISPLAY_TOLERANCE_M)
+    roads_display = shapely.simplify(np.array([rd["geom"] for rd in _roads], dtype=object), DISPLAY_TOLERANCE_M)
+
+    # Buildings - reproject each footprint once
+    building_features = []
+    for (geom, btype), simple in zip(_buildings, buildings_display):
+        if not geom.is_valid or geom.area < 20:
+            continue
+        coords = _geom_to_coords(simple, _inv)
+        if len(coords) < 3:
+            continue
+        building_features.append({
+            "type": "Feature", "geometry": {"type": "Polygon", "coordinates": [coords]},
+            "properties": {"name": btype.replace("building=", "").title().replace("Yes", "Generic Building"),
+                           "area": f"{geom.area:,.0f}", "tag": btype,
+                           "_fillColor": tag_to_color.get(btype, tag_to_color["Other"])}  # top-10 colour or "Other"
+        })
+
+    folium.GeoJson(
+        {"type": "FeatureCollection", "features": building_features},
+        style_function=lambda x: {
+            "fillColor": x["properties"]["_fillColor"],
+            "color": "#2c3e50", "weight": 1.3, "fillOpacity": 0.85
+        },
+        tooltip=folium.GeoJsonTooltip(["name", "area"], aliases=["Type:", "Area (m²):"])
+    ).add_to(m)
+
+    # Water Bodies
+    if _waters:
+        water_geojson = {
+            "type": "FeatureCollection",
+            "features": [{
+                "type": "Feature",
+                "geometry": {"type": simple.type, "coordinates": [
+                    _geom_to_coords(simple, _inv) if simple.type == "Polygon" else
+                    [_geom_to_coords(g, _inv) for g in simple.geoms]
+                ]},
+                "properties": {"area": f"{poly.area:,.0f}"}
+            } for poly, simple in zip(_waters, water_display) if poly.is_valid and poly.area >= 200]
+        }
+        if water_geojson["features"]:
+            folium.GeoJson(water_geojson,
+                           style_function=lambda x: {"fillColor": "#00d4ff", "color": "#00ffff", "weight": 10, "fillOpacity": 0.8},
+                           tooltip=folium.GeoJsonTooltip(["area"], aliases=["Water (m²):"])).add_to(m)
+
+    # Roads - Neon Glow (Single Clean Layer)
+    # === ROADS - Neon Glow + Smart Width Tooltip ===
+    # === ROADS - Soft & Premium Neon Glow (Lower Brightness) ===
+    roads_layer = folium.FeatureGroup(name="Roads (Neon Glow)", show=True)
+    roads_geojson = {"type": "FeatureCollection", "features": []}
+
+    for rd, simple in zip(_roads, roads_display):
+        line = rd["geom"]
+        if line.is_empty or line.length < 5:
+            continue
+
+        length_str = f"Length: {line.length:.0f} m"
+        width = rd["width"]
+        source = rd["width_source"]
+
+        width_str = ""
+        if source in ("osm", "lanes"):
+            if source == "osm":
+                width_str = f"Width: {width:.1f} m (from OSM)".replace(".0 m", " m")
+            else:
+                width_str = f"Width: {width:.1f} m (estimated from lanes)".replace(".0 m", " m")
+
+        tooltip_lines = [length_str]
+        if width_str:
+            tooltip_lines.append(width_str)
+        tooltip_html = "<br>".join(tooltip_lines)
+
+        coords = _geom_to_coords(simple, _inv)
+        roads_geojson["features"].append({
             "type": "Feature",
-            "geometry": {"type": poly.type, "coordinates": [
-                _geom_to_coords(poly, inv) if poly.type == "Polygon" else
-                [_geom_to_coords(g, inv) for g in poly.geoms]
-            ]},
-            "properties": {"area": f"{poly.area:,.0f}"}
-        } for poly in water_polygons if poly.is_valid and poly.area >= 200]
-    }
-    if water_geojson["features"]:
-        folium.GeoJson(water_geojson,
-                       style_function=lambda x: {"fillColor": "#00d4ff", "color": "#00ffff", "weight": 10, "fillOpacity": 0.8},
-                       tooltip=folium.GeoJsonTooltip(["area"], aliases=["Water (m²):"])).add_to(m)
-
-# Roads - Neon Glow (Single Clean Layer)
-# === ROADS - Neon Glow + Smart Width Tooltip ===
-# === ROADS - Soft & Premium Neon Glow (Lower Brightness) ===
-roads_layer = folium.FeatureGroup(name="Roads (Neon Glow)", show=True)
-roads_geojson = {"type": "FeatureCollection", "features": []}
-
-for rd in road_details:
-    line = rd["geom"]
-    if line.is_empty or line.length < 5:
-        continue
-
-    length_str = f"Length: {line.length:.0f} m"
-    width = rd["width"]
-    source = rd["width_source"]
-
-    width_str = ""
-    if source in ("osm", "lanes"):
-        if source == "osm":
-            width_str = f"Width: {width:.1f} m (from OSM)".replace(".0 m", " m")
-        else:
-            width_str = f"Width: {width:.1f} m (estimated from lanes)".replace(".0 m", " m")
-
-    tooltip_lines = [length_str]
-    if width_str:
-        tooltip_lines.append(width_str)
-    tooltip_html = "<br>".join(tooltip_lines)
-
-    coords = [inv.transform(x, y) for x, y in line.coords]
-    roads_geojson["features"].append({
-        "type": "Feature",
-        "geometry": {"type": "LineString", "coordinates": coords},
-        "properties": {"info": tooltip_html}
-    })
-
-# Soft & Elegant Neon (Lower Brightness, More Professional)
-if roads_geojson["features"]:
-    glow_styles = [
-        {"color": "#ff4081", "weight": 32, "opacity": 0.25},   # Very soft outer glow
-        {"color": "#ff79b0", "weight": 20, "opacity": 0.40},   # Subtle mid glow
-        {"color": "#ffffff", "weight": 10, "opacity": 0.60},   # Soft white core
-        {"color": "#ff1744", "weight": 6,  "opacity": 1.00}    # Bright red line (thin!)
-    ]
-
-    # Outer soft layers
-    for style in glow_styles[:-1]:
+            "geometry": {"type": "LineString", "coordinates": coords},
+            "properties": {"info": tooltip_html}
+        })
+
+    # Soft & Elegant Neon (Lower Brightness, More Professional)
+    # One GeoJSON layer; the glow is a CSS drop-shadow stack composited by the browser
+    # instead of three extra copies of every road path
+    if roads_geojson["features"]:
+        m.get_root().header.add_child(folium.Element("""
+        <style>
+        .road-neon {
+            filter: drop-shadow(0 0 2px rgba(255,255,255,0.60))   /* Soft white core */
+                    drop-shadow(0 0 5px rgba(255,121,176,0.40))   /* Subtle mid glow */
+                    drop-shadow(0 0 10px rgba(255,64,129,0.25));  /* Very soft outer glow */
+        }
+        </style>
+        """))
+        road_style = {"className": "road-neon", "color": "#ff1744", "weight": 6, "opacity": 1.00}  # Bright red line (thin!)
+
+        # Final sharp line with tooltip
         folium.GeoJson(
             roads_geojson,
-            style_function=lambda x, s=style: s
+            style_function=lambda x: road_style,
+            tooltip=folium.GeoJsonTooltip(
+                fields=["info"],
+                aliases=[""],
+                style="""
+                    background: #0f0f0f;
+                    color: #00ff88;
+                    font-weight: bold;
+                    font-size: 14px;
+                    padding: 12px 16px;
+                    border-radius: 12px;
+                    border: 2px solid #00ff88;
+                    box-shadow: 0 0 20px rgba(0,255,136,0.5);
+                    font-family: 'Segoe UI', sans-serif;
+                    text-align: left;
+                    line-height: 1.7;
+                """,
+                sticky=True
+            )
         ).add_to(roads_layer)
 
-    # Final sharp line with tooltip
-    folium.GeoJson(
-        roads_geojson,
-        style_function=lambda x: glow_styles[-1],
-        tooltip=folium.GeoJsonTooltip(
-            fields=["info"],
-            aliases=[""],
-            style="""
-                background: #0f0f0f;
-                color: #00ff88;
-                font-weight: bold;
-                font-size: 14px;
-                padding: 12px 16px;
-                border-radius: 12px;
-                border: 2px solid #00ff88;
-                box-shadow: 0 0 20px rgba(0,255,136,0.5);
-                font-family: 'Segoe UI', sans-serif;
-                text-align: left;
-                line-height: 1.7;
-            """,
-            sticky=True
-        )
-    ).add_to(roads_layer)
-
-roads_layer.add_to(m)
-
-folium.CircleMarker([lat, lng], radius=16, color="#ffd700", fillColor="#ff6b00", weight=5,
-                    tooltip="Center").add_to(m)
-
-folium.LayerControl(collapsed=False).add_to(m)
+    roads_layer.add_to(m)
 
+    folium.CircleMarker([lat, lng], radius=16, color="#ffd700", fillColor="#ff6b00", weight=5,
+                        tooltip="Center").add_to(m)
 
-# ================================
-# LEGEND
-# ================================
-legend_html = '''
-<div style="position: fixed; bottom: 20px; left: 20px; width: 340px; background: rgba(255,255,255,0.98);
-            border-radius: 16px; padding: 20px; box-shadow: 0 8px 40px rgba(0,0,0,0.45); z-index: 9999;
-            font-family: 'Segoe UI', sans-serif; border: 4px solid #2c3e50;">
-  <b style="font-size: 21px; color: #2c3e50;">Urban Congestion Pro • Legend</b>
-  <hr style="margin: 12px 0; border-color: #ddd;">
-  <div style="margin: 14px 0;"><i style="background:#ff1744; width:44px; height:14px; display:inline-block; margin-right:14px; 
-     border-radius:8px; box-shadow: 0 0 20px #ff1744;"></i><b style="color:#c62828; font-size:17px;">Roads (Neon)</b></div>
-  <div style="margin: 16px 0;"><i style="background:#00ffff; border:5px solid #00d4ff; width:34px; height:34px; display:inline-block; 
-     margin:8px 14px 8px 0; border-radius:10px; box-shadow: 0 0 16px #00ffff;"></i><b style="color:#006064; font-size:17px;">Water Bodies</b></div>
-  <hr style="margin: 14px 0; border-color: #ddd;">
-'''
-for tag in top_tags:
-    clean = tag.replace("building=", "").title()
-    if clean == "Yes": clean = "Generic Building"
-    legend_html += f'<i style="background:{tag_to_color[tag]}; width:26px; height:26px; float:left; margin:8px 12px 8px 0; border-radius:8px; border:1px solid #444;"></i><span style="line-height:32px; font-size:15px;">{clean}</span><br>'
-legend_html += '<i style="background:#95a5a6; width:26px; height:26px; float:left; margin:8px 12px 8px 0; border-radius:8px;"></i><span style="line-height:32px; font-size:15px;">Other Buildings</span></div>'
-m.get_root().html.add_child(folium.Element(legend_html))
+    folium.LayerControl(collapsed=False).add_to(m)
+
+
+    # ================================
+    # LEGEND
+    # ================================
+    legend_html = '''
+    <div style="position: fixed; bottom: 20px; left: 20px; width: 340px; background: rgba(255,255,255,0.98);
+                border-radius: 16px; padding: 20px; box-shadow: 0 8px 40px rgba(0,0,0,0.45); z-index: 9999;
+                font-family: 'Segoe UI', sans-serif; border: 4px solid #2c3e50;">
+      <b style="font-size: 21px; color: #2c3e50;">Urban Congestion Pro • Legend</b>
+      <hr style="margin: 12px 0; border-color: #ddd;">
+      <div style="margin: 14px 0;"><i style="background:#ff1744; width:44px; height:14px; display:inline-block; margin-right:14px; 
+         border-radius:8px; box-shadow: 0 0 20px #ff1744;"></i><b style="color:#c62828; font-size:17px;">Roads (Neon)</b></div>
+      <div style="margin: 16px 0;"><i style="background:#00ffff; border:5px solid #00d4ff; width:34px; height:34px; display:inline-block; 
+         margin:8px 14px 8px 0; border-radius:10px; box-shadow: 0 0 16px #00ffff;"></i><b style="color:#006064; font-size:17px;">Water Bodies</b></div>
+      <hr style="margin: 14px 0; border-color: #ddd;">
+    '''
+    for tag in top_tags:
+        clean = tag.replace("building=", "").title()
+        if clean == "Yes": clean = "Generic Building"
+        legend_html += f'<i style="background:{tag_to_color[tag]}; width:26px; height:26px; float:left; margin:8px 12px 8px 0; border-radius:8px; border:1px solid #444;"></i><span style="line-height:32px; font-size:15px;">{clean}</span><br>'
+    legend_html += '<i style="background:#95a5a6; width:26px; height:26px; float:left; margin:8px 12px 8px 0; border-radius:8px;"></i><span style="line-height:32px; font-size:15px;">Other Buildings</span></div>'
+    m.get_root().html.add_child(folium.Element(legend_html))
+
+    return m.get_root().render()
+
+
+map_html = _render_map_html(lat, lng, radius, metrics, top_tags, tag_to_color,
+                            buildings_with_type, road_details, water_polygons, inv)
 
 
 # ================================
@@ -286,7 +324,7 @@ col_map, col_report = st.columns([2.4, 1])
 
 with col_map:
     st.subheader(f"Analysis Zone • {radius:,} m radius around {lat:.4f}°, {lng:.4f}°")
-    folium_static(m, width=1200, height=750)
+    components.html(map_html, width=1200, height=750, scrolling=False)
     c1, c2 = st.columns(2)
     with c1: st.plotly_chart(fig_land, use_container_width=True)
     with c2: st.plotly_chart(fig_pie, use_container_width=True)
@@ -312,7 +350,7 @@ with col_report:
     """, unsafe_allow_html=True)
 
     st.markdown("### Top 10 Building Types")
-    for tag, area in sorted(type_areas.items(), key=lambda x: x[1], reverse=True)[:10]:
+    for tag, area in sorted_types[:10]:
         clean = tag.replace("building=", "").title().replace("Yes", "Generic Building")
         pct = area / total_building_area * 100 if total_building_area > 0 else 0
         st.markdown(f"**{clean}** – {area:,.0f} m² ({pct:.1f}%)")
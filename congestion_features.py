@@ -1,12 +1,20 @@
 # congestion_features.py
 from __future__ import annotations
 import math
+import sys
+import threading
 import time
-from typing import Dict, List, Tuple
+from collections import OrderedDict
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Dict, Iterable, List, NamedTuple, Tuple
 import requests
+import requests_cache
+import orjson
 import numpy as np
-from shapely.geometry import Point, Polygon, LineString
-from shapely.validation import make_valid
+import shapely
+from shapely.geometry import Point, Polygon
 from pyproj import CRS, Transformer
 
 # CONFIG
@@ -14,41 +22,304 @@ OVERPASS_ENDPOINTS = ["https://overpass-api.de/api/interpreter"]
 USER_AGENT = "UrbanCongestionDetector-IN/1.0"
 TIMEOUT = 90
 RETRY = 3
+BACKOFF_MAX_S = 30        # cap for the exponential retry delay and for server Retry-After hints
+MIN_AREA_M2 = 1.0         # ways whose footprint cannot reach this area never become GEOS polygons
+MIN_ROAD_LENGTH_M = 1.0
+CACHE_EXPIRE_S = 24 * 3600
+TILES_PER_DEG = 400       # tile edge 0.0025 deg (~280 m): the unit Overpass data is downloaded and reused in
+TILE_CACHE_MAX_MB = 64    # rough cap on the memory held by cached tiles
+
+# Overpass responses persist on disk (overpass_cache.sqlite), so repeated or nearby queries skip the API
+_SESSION = requests_cache.CachedSession("overpass_cache", expire_after=CACHE_EXPIRE_S, allowable_methods=("GET", "POST"))
 
 DEFAULT_WIDTHS = {
     "motorway": 24, "trunk": 22, "primary": 18, "secondary": 14,
     "tertiary": 10, "residential": 7, "unclassified": 7, "service": 6,
 }
 
+# Transformers depend only on the UTM zone, so each one is built once per process;
+# forward and inverse are cached separately so forward-only callers never build an inverse
+def _utm_crs(zone: int, south: bool) -> CRS:
+    return CRS.from_string(f"+proj=utm +zone={zone} +{'south' if south else 'north'} +datum=WGS84 +units=m +no_defs")
+
+@lru_cache(maxsize=64)
+def _fwd_transformer(zone: int, south: bool) -> Transformer:
+    return Transformer.from_crs(CRS.from_epsg(4326), _utm_crs(zone, south), always_xy=True)
+
+@lru_cache(maxsize=64)
+def _inv_transformer(zone: int, south: bool) -> Transformer:
+    return Transformer.from_crs(_utm_crs(zone, south), CRS.from_epsg(4326), always_xy=True)
+
+def _utm_zone(lat: float, lng: float) -> Tuple[int, bool]:
+    return int((math.floor((lng + 180) / 6) % 60) + 1), lat < 0
+
 def _projector(lat: float, lng: float) -> Tuple[Transformer, Transformer]:
-    wgs84 = CRS.from_epsg(4326)
-    zone = int((math.floor((lng + 180) / 6) % 60) + 1)
-    south = lat < 0
-    utm = CRS.from_string(f"+proj=utm +zone={zone} +{'south' if south else 'north'} +datum=WGS84 +units=m +no_defs")
-    fwd = Transformer.from_crs(wgs84, utm, always_xy=True)
-    inv = Transformer.from_crs(utm, wgs84, always_xy=True)
-    return fwd, inv
-
-def _buffer_circle(lat: float, lng: float, radius_m: float) -> Polygon:
-    fwd, _ = _projector(lat, lng)
+    zone, south = _utm_zone(lat, lng)
+    return _fwd_transformer(zone, south), _inv_transformer(zone, south)
+
+# 16 segments per quarter (64 around) instead of 32: every clip against the circle does half the
+# segment work, and the inscribed polygon still covers ~99.84% of the true circle (0.04% short at 32)
+def _buffer_circle(lat: float, lng: float, radius_m: float, fwd: Transformer, quad_segs: int = 16) -> Polygon:
     x, y = fwd.transform(lng, lat)
-    return Point(x, y).buffer(radius_m, resolution=32)
+    return Point(x, y).buffer(radius_m, quad_segs=quad_segs)
+
+# Seconds the server asked us to wait; Retry-After may also be an HTTP date, which we don't parse
+def _retry_after(r: requests.Response, default: float) -> float:
+    try:
+        return min(float(r.headers.get("Retry-After", default)), BACKOFF_MAX_S)
+    except ValueError:
+        return default
 
-def _overpass(query: str) -> Dict:
+def _overpass(query: str) -> List[dict]:
     headers = {"User-Agent": USER_AGENT}
+    backoff = 1.0
+    refresh = False  # after a failed attempt, never answer the retry from the cache
     for _ in range(RETRY):
         for url in OVERPASS_ENDPOINTS:
+            r = None
             try:
-                r = requests.post(url, data={"data": query}, headers=headers, timeout=TIMEOUT)
+                r = _SESSION.post(url, data={"data": query}, headers=headers, timeout=TIMEOUT, force_refresh=refresh)
                 if r.status_code in (429, 500, 502, 503, 504):
-                    time.sleep(2)
+                    time.sleep(_retry_after(r, backoff))
+                    backoff = min(backoff * 2, BACKOFF_MAX_S)
                     continue
                 r.raise_for_status()
-                return r.json()
-            except:
-                time.sleep(1)
+                data = orjson.loads(r.content)  # C parser, much faster than r.json() on multi-MB payloads
+                if "remark" in data:
+                    # Overpass answers timeouts / out-of-memory with 200 + a remark and partial elements
+                    raise ValueError(data["remark"])
+                return data.get("elements", [])
+            except (requests.RequestException, ValueError):  # network / HTTP errors, malformed JSON, remark
+                if r is not None:
+                    # Every 200 is cached before we see it; evict it so the retry goes back to the server
+                    _SESSION.cache.delete(requests=[r.request])
+                refresh = True
+                time.sleep(backoff)
+                backoff = min(backoff * 2, BACKOFF_MAX_S)
     raise RuntimeError("Overpass failed")
 
+# === Tile cache ===
+# Space is cut into fixed lat/lng tiles keyed (floor(lat*400), floor(lng*400)). Each tile is
+# downloaded once and its ways kept in memory, so a sweep of nearby or overlapping queries
+# only asks Overpass for the tiles it has not seen yet. Query bboxes are unions of tiles,
+# which also keeps the query text (the disk cache key) stable between nearby points.
+Tile = Tuple[int, int]
+
+# Ways packed flat: way i owns rows lonlat[offsets[i]:offsets[i+1]] and has OSM id ids[i],
+# tags tags[i]; kinds holds the building / road / water masks. The masks overlap, a way
+# tagged both building and highway feeds both collectors.
+class Ways(NamedTuple):
+    ids: np.ndarray
+    lonlat: np.ndarray
+    offsets: np.ndarray
+    tags: List[dict]
+    kinds: Dict[str, np.ndarray]
+
+# Single pass over the response: coordinates go into flat buffers and each way is classified once
+def _pack_ways(elements: Iterable[dict]) -> Ways:
+    lonlat = array("d")
+    counts, ids, tags = [0], [], []
+    is_building, is_road, is_water = [], [], []
+    for el in elements:
+        geom = el.get("geometry")
+        if el.get("type") != "way" or not geom:
+            continue
+        for p in geom:
+            lonlat.append(p["lon"])
+            lonlat.append(p["lat"])
+        counts.append(len(geom))
+        ids.append(el["id"])
+        t = el.get("tags", {})
+        tags.append(t)
+        is_building.append(bool(t.get("building")))
+        is_road.append("highway" in t)
+        is_water.append(t.get("natural") == "water" or t.get("waterway") == "riverbank")
+
+    kinds = {
+        "building": np.array(is_building, dtype=bool),
+        "road": np.array(is_road, dtype=bool),
+        "water": np.array(is_water, dtype=bool),
+    }
+    return Ways(np.array(ids, dtype=np.int64), np.frombuffer(lonlat, dtype=np.float64).reshape(-1, 2),
+                np.cumsum(counts, dtype=np.int64), tags, kinds)
+
+# Ways idx, in that order, as a new packed batch
+def _take_ways(ways: Ways, idx: np.ndarray) -> Ways:
+    counts = np.diff(ways.offsets)[idx]
+    offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+    rows = np.repeat(ways.offsets[:-1][idx] - offsets[:-1], counts) + np.arange(offsets[-1])
+    return Ways(ways.ids[idx], ways.lonlat[rows], offsets, [ways.tags[i] for i in idx],
+                {k: m[idx] for k, m in ways.kinds.items()})
+
+# Ways spanning several tiles come back once each, in id order as Overpass itself returns them
+def _merge_ways(parts: List[Ways]) -> Ways:
+    shifts = np.cumsum([0] + [len(p.lonlat) for p in parts])
+    both = Ways(np.concatenate([p.ids for p in parts]),
+                np.concatenate([p.lonlat for p in parts]),
+                np.concatenate([[0]] + [p.offsets[1:] + s for p, s in zip(parts, shifts)]).astype(np.int64),
+                [t for p in parts for t in p.tags],
+                {k: np.concatenate([p.kinds[k] for p in parts]) for k in parts[0].kinds})
+    _, first = np.unique(both.ids, return_index=True)
+    return _take_ways(both, first)
+
+def _ways_nbytes(ways: Ways) -> int:
+    arrays = ways.ids.nbytes + ways.lonlat.nbytes + ways.offsets.nbytes + sum(m.nbytes for m in ways.kinds.values())
+    return arrays + sum(sys.getsizeof(t) for t in ways.tags)  # tag dicts are shared, so this overcounts
+
+def _covering_tiles(s: float, w: float, n: float, e: float) -> List[Tile]:
+    return [(i, j)
+            for i in range(math.floor(s * TILES_PER_DEG), math.ceil(n * TILES_PER_DEG))
+            for j in range(math.floor(w * TILES_PER_DEG), math.ceil(e * TILES_PER_DEG))]
+
+def _tile_rect(tiles: Iterable[Tile]) -> Tuple[int, int, int, int]:
+    i, j = zip(*tiles)
+    return min(i), min(j), max(i) + 1, max(j) + 1
+
+def _rect_bbox(rect: Tuple[int, int, int, int]) -> Tuple[float, float, float, float]:
+    return tuple(round(v / TILES_PER_DEG, 6) for v in rect)
+
+# Hand every way to each tile of rect its bounds overlap; ways reaching past rect are
+# only stored under the tiles inside it, since the others were not fully downloaded
+def _split_into_tiles(ways: Ways, rect: Tuple[int, int, int, int]) -> Dict[Tile, Ways]:
+    i0, j0, i1, j1 = rect
+    if len(ways.ids):
+        starts = ways.offsets[:-1]
+        cell = np.floor(ways.lonlat * TILES_PER_DEG).astype(np.int64)
+        j_lo, i_lo = np.minimum.reduceat(cell, starts).T
+        j_hi, i_hi = np.maximum.reduceat(cell, starts).T
+    else:
+        i_lo = i_hi = j_lo = j_hi = np.empty(0, dtype=np.int64)
+
+    tiles = {}
+    for i in range(i0, i1):
+        row = (i_lo <= i) & (i <= i_hi)
+        for j in range(j0, j1):
+            tiles[(i, j)] = _take_ways(ways, np.flatnonzero(row & (j_lo <= j) & (j <= j_hi)))
+    return tiles
+
+class TileCache:
+    # Bounded by an estimate of the memory held, and tiles expire together with the disk cache
+    def __init__(self, max_bytes: int = TILE_CACHE_MAX_MB << 20, ttl_s: float = CACHE_EXPIRE_S):
+        self.max_bytes = max_bytes
+        self.ttl_s = ttl_s
+        self._tiles: OrderedDict[Tile, Tuple[float, int, Ways]] = OrderedDict()  # tile -> (fetched at, bytes, ways)
+        self._nbytes = 0
+        self._lock = threading.Lock()  # Streamlit sessions share the module on separate threads
+
+    def _drop(self, tile: Tile) -> None:
+        self._nbytes -= self._tiles.pop(tile)[1]
+
+    # All ways touching the given tiles. Missing or expired tiles are fetched together with
+    # one download(bbox) call over their bounding rectangle. download raises when Overpass
+    # fails, so nothing from a failed or partial response is ever stored.
+    def ways(self, tiles: List[Tile], download) -> Ways:
+        now = time.monotonic()
+        with self._lock:
+            for t in [t for t in tiles if t in self._tiles and now - self._tiles[t][0] > self.ttl_s]:
+                self._drop(t)
+            have = {t: self._tiles[t][2] for t in tiles if t in self._tiles}
+            for t in have:
+                self._tiles.move_to_end(t)
+        missing = [t for t in tiles if t not in have]
+        if missing:
+            rect = _tile_rect(missing)
+            fetched = _split_into_tiles(_pack_ways(download(_rect_bbox(rect))), rect)
+            with self._lock:
+                for t, w in fetched.items():
+                    if t in self._tiles:
+                        self._drop(t)
+                    size = _ways_nbytes(w)
+                    self._tiles[t] = (now, size, w)
+                    self._nbytes += size
+                while self._nbytes > self.max_bytes and self._tiles:
+                    self._drop(next(iter(self._tiles)))
+            have.update(fetched)
+        return _merge_ways([have[t] for t in tiles])
+
+_TILES = TileCache()
+
+# Project every way's coordinates in one PROJ call; the cached lon/lat rows stay untouched
+def _project_ways(ways: Ways, fwd: Transformer) -> np.ndarray:
+    xs, ys = ways.lonlat[:, 0].copy(), ways.lonlat[:, 1].copy()
+    fwd.transform(xs, ys, inplace=True)
+    return np.column_stack([xs, ys])
+
+# Per-way polyline length straight from the projected coordinates
+def _way_lengths(xy: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+    seg = np.hypot(*np.diff(xy, axis=0).T)
+    along = np.concatenate([[0.0], np.cumsum(seg)])  # distance from row 0 to each row
+    return along[offsets[1:] - 1] - along[offsets[:-1]]
+
+# Upper bound on the area any repair of a way's ring can cover: half the sum of |cross|
+# over the fan of triangles from its first vertex. Unlike the signed shoelace area it
+# does not cancel out on self-intersecting (bow-tie) rings that make_valid would split.
+def _way_area_bounds(xy: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+    starts = offsets[:-1]
+    rel = xy - np.repeat(xy[starts], np.diff(offsets), axis=0)
+    cross = np.abs(rel[:-1, 0] * rel[1:, 1] - rel[1:, 0] * rel[:-1, 1])
+    fan = np.concatenate([[0.0], np.cumsum(cross)])
+    return 0.5 * (fan[offsets[1:] - 1] - fan[starts])
+
+# Build one geometry per selected way in a single GEOS call
+def _build_polygons(xy: np.ndarray, offsets: np.ndarray, keep: np.ndarray) -> np.ndarray:
+    counts = np.diff(offsets)
+    indices = np.repeat(np.arange(int(keep.sum())), counts[keep])
+    polys = shapely.polygons(shapely.linearrings(xy[np.repeat(keep, counts)], indices=indices))
+
+    # Repair only the invalid subset
+    invalid = ~shapely.is_valid(polys)
+    if invalid.any():
+        polys[invalid] = shapely.make_valid(polys[invalid])
+    return polys
+
+def _build_lines(xy: np.ndarray, offsets: np.ndarray, keep: np.ndarray) -> np.ndarray:
+    counts = np.diff(offsets)
+    indices = np.repeat(np.arange(int(keep.sum())), counts[keep])
+    return shapely.linestrings(xy[np.repeat(keep, counts)], indices=indices)
+
+def _intersection(geoms: np.ndarray, buf: Polygon) -> np.ndarray:
+    try:
+        return shapely.intersection(geoms, buf)
+    except shapely.errors.GEOSException:
+        # One bad geometry fails the whole batch; clip the rest one by one
+        out = np.empty(len(geoms), dtype=object)
+        for i, g in enumerate(geoms):
+            try:
+                out[i] = g.intersection(buf)
+            except shapely.errors.GEOSException:
+                out[i] = None
+        return out
+
+# True where a geometry's bbox lies inside the circle inscribed in buf,
+# i.e. the geometry is certainly within buf and needs no clipping
+def _inside_buffer(geoms: np.ndarray, buf: Polygon) -> np.ndarray:
+    cx, cy = buf.centroid.coords[0]
+    r_in = buf.exterior.distance(Point(cx, cy))
+    b = shapely.bounds(geoms).reshape(-1, 4)
+    dx = np.maximum(np.abs(b[:, 0] - cx), np.abs(b[:, 2] - cx))
+    dy = np.maximum(np.abs(b[:, 1] - cy), np.abs(b[:, 3] - cy))
+    return dx * dx + dy * dy < r_in * r_in
+
+# Clip polygons to the analysis circle; returns (positions in polys, clipped geoms)
+def _clip_to_buffer(polys: np.ndarray, buf: Polygon) -> Tuple[np.ndarray, np.ndarray]:
+    # STRtree bbox pass discards the bbox corners outside the circle before any exact test
+    idx = np.sort(shapely.STRtree(polys).query(buf, predicate="intersects"))
+    idx = idx[shapely.is_valid(polys[idx])]
+
+    # Polygons inside the circle are kept whole; only boundary ones are clipped.
+    # The bbox test settles most of them arithmetically, contains_properly the rest.
+    inters = polys[idx]
+    boundary = np.flatnonzero(~_inside_buffer(inters, buf))
+    boundary = boundary[~shapely.contains_properly(buf, inters[boundary])]
+    inters[boundary] = _intersection(inters[boundary], buf)
+
+    keep = ~shapely.is_empty(inters)
+    invalid = keep & ~shapely.is_valid(inters)
+    if invalid.any():
+        inters[invalid] = shapely.make_valid(inters[invalid])
+    keep &= shapely.is_valid(inters)
+    return idx[keep], inters[keep]
+
 # NEW: Return raw building tag or fallback
 def _get_building_type(tags: dict) -> str:
     b = tags.get("building")
@@ -60,57 +331,25 @@ def _get_building_type(tags: dict) -> str:
         return "building=yes"
     return f"building={b}"
 
-def _collect_buildings(data: Dict, fwd: Transformer, buf: Polygon) -> List[Tuple[Polygon, str]]:
-    buildings = []
-    for el in data.get("elements", []):
-        tags = el.get("tags", {})
-        if not tags.get("building"): 
-            continue  # Only buildings with building=*
-        geom = el.get("geometry")
-        if not geom or len(geom) < 3: 
-            continue
-
-        coords = [(p["lon"], p["lat"]) for p in geom]
-        xs, ys = zip(*[fwd.transform(lon, lat) for lon, lat in coords])
-        try:
-            poly = Polygon(list(zip(xs, ys)))
-            if not poly.is_valid: 
-                poly = make_valid(poly)
-            if not poly.is_valid: 
-                continue
-
-            inter = poly.intersection(buf)
-            if inter.is_empty: 
-                continue
-            if not inter.is_valid: 
-                inter = make_valid(inter)
-            if not inter.is_valid: 
-                continue
-
-            btype = _get_building_type(tags)
-            buildings.append((inter, btype))  # INCLUDE ALL
-        except: 
-            continue
-    return buildings
+def _collect_buildings(xy: np.ndarray, offsets: np.ndarray, tags_list: List[dict], is_building: np.ndarray, buf: Polygon) -> List[Tuple[Polygon, str]]:
+    counts = np.diff(offsets)
+    keep = is_building & (counts >= 3)  # Only buildings with building=*
+    keep[keep] = _way_area_bounds(xy, offsets)[keep] >= MIN_AREA_M2
+    polys = _build_polygons(xy, offsets, keep)
+    tags_kept = [t for t, k in zip(tags_list, keep) if k]
 
-def _collect_roads(data: Dict, fwd: Transformer) -> List[dict]:
-    roads = []
-    for el in data.get("elements", []):
-        if el.get("type") != "way": 
-            continue
-        tags = el.get("tags", {})
-        if "highway" not in tags: 
-            continue
-        geom = el.get("geometry")
-        if not geom or len(geom) < 2: 
-            continue
+    idx, inters = _clip_to_buffer(polys, buf)
+    return [(inter, _get_building_type(tags_kept[i])) for i, inter in zip(idx, inters)]  # INCLUDE ALL
 
-        coords = [(p["lon"], p["lat"]) for p in geom]
-        xs, ys = zip(*[fwd.transform(lon, lat) for lon, lat in coords])
-        line = LineString(list(zip(xs, ys)))
-        if line.length < 1: 
-            continue
+def _collect_roads(xy: np.ndarray, offsets: np.ndarray, tags_list: List[dict], is_road: np.ndarray, buf: Polygon) -> Tuple[float, List[dict]]:
+    counts = np.diff(offsets)
+    keep = is_road & (counts >= 2)
+    keep &= _way_lengths(xy, offsets) >= MIN_ROAD_LENGTH_M
+    lines = _build_lines(xy, offsets, keep)
+    tags_kept = [t for t, k in zip(tags_list, keep) if k]
 
+    widths, sources = [], []
+    for tags in tags_kept:
         # === SMART WIDTH DETECTION + SOURCE TRACKING ===
         width = None
         width_source = None  # "osm", "lanes", "fallback", None
@@ -120,7 +359,7 @@ def _collect_roads(data: Dict, fwd: Transformer) -> List[dict]:
             try:
                 width = max(3.0, float(str(tags["width"]).split()[0]))
                 width_source = "osm"
-            except:
+            except (ValueError, IndexError):  # "abc", "" ...
                 pass
 
         # 2. From lanes= tag
@@ -129,7 +368,7 @@ def _collect_roads(data: Dict, fwd: Transformer) -> List[dict]:
                 lanes = float(str(tags["lanes"]).split()[0])
                 width = max(7.0, lanes * 3.5)  # Indian standard
                 width_source = "lanes"
-            except:
+            except (ValueError, IndexError):
                 pass
 
         # 3. Fallback from highway type (DO NOT use for display!)
@@ -138,129 +377,102 @@ def _collect_roads(data: Dict, fwd: Transformer) -> List[dict]:
             width = fallback
             width_source = "fallback"
 
-        roads.append({
-            "geom": line,
-            "width": width,           # numeric value (always exists)
-            "width_source": width_source,  # "osm" | "lanes" | "fallback"
+        # === SMART SOURCE DECISION (THIS IS THE KEY FIX) ===
+        if width_source == "osm":
+            final_source = "osm"
+        elif width_source == "lanes":
+            final_source = "lanes"
+        elif width is not None and width >= 3.0:  # Real width exists → treat as OSM
+            final_source = "osm"
+        else:
+            final_source = "fallback"
+
+        widths.append(width)           # numeric value (always exists)
+        sources.append(final_source)
+
+    # === VECTORIZED ROAD CLIPPING — ONE GEOS BATCH, METADATA PRESERVED ===
+    # Only roads the STRtree finds touching the circle need the overlay; the rest clip to empty
+    clipped = np.full(len(lines), Point(), dtype=object)  # empty placeholder
+    hit = shapely.STRtree(lines).query(buf, predicate="intersects")
+    clipped[hit] = _intersection(lines[hit], buf)
+    lengths = shapely.length(clipped)
+    clip_keep = np.flatnonzero(~shapely.is_empty(clipped) & (lengths >= 1))
+    road_area_total = float(np.dot(lengths[clip_keep], np.asarray(widths, dtype=np.float64)[clip_keep]))
+
+    road_details = []
+    segments, seg_road = shapely.get_parts(clipped[clip_keep], return_index=True)
+    for seg, i in zip(segments, clip_keep[seg_road]):
+        tags = tags_kept[i]
+        road_details.append({
+            "geom": seg,
+            "width": widths[i],
+            "width_source": sources[i],  # "osm" | "lanes" | "fallback"
             "highway": tags.get("highway", ""),
             "name": tags.get("name", "")
         })
-    return roads
+    return road_area_total, road_details
     
     
-def _collect_water(data: Dict, fwd: Transformer, buf: Polygon) -> float:
-    water_area = 0.0
-    for el in data.get("elements", []):
-        tags = el.get("tags", {})
-        if tags.get("natural") != "water" and tags.get("waterway") != "riverbank":
-            continue
-        geom = el.get("geometry")
-        if not geom or len(geom) < 3: continue
-        coords = [(p["lon"], p["lat"]) for p in geom]
-        xs, ys = zip(*[fwd.transform(lon, lat) for lon, lat in coords])
-        try:
-            poly = Polygon(list(zip(xs, ys)))
-            if not poly.is_valid: poly = make_valid(poly)
-            if not poly.is_valid: continue
-            inter = poly.intersection(buf)
-            if not inter.is_empty:
-                water_area += inter.area
-        except: continue
-    return water_area
-
-def _collect_water_polygons(data: Dict, fwd: Transformer, buf: Polygon) -> List[Polygon]:
-    waters = []
-    for el in data.get("elements", []):
-        tags = el.get("tags", {})
-        if tags.get("natural") != "water" and tags.get("waterway") != "riverbank":
-            continue
-        geom = el.get("geometry")
-        if not geom or len(geom) < 3: continue
-        coords = [(p["lon"], p["lat"]) for p in geom]
-        xs, ys = zip(*[fwd.transform(lon, lat) for lon, lat in coords])
-        try:
-            poly = Polygon(list(zip(xs, ys)))
-            if not poly.is_valid: poly = make_valid(poly)
-            if not poly.is_valid: continue
-            inter = poly.intersection(buf)
-            if not inter.is_empty:
-                waters.append(inter)
-        except: continue
-    return waters
-
-def get_congestion_features(lat: float, lng: float, radius: int = 500):
-    fwd, inv = _projector(lat, lng)
-    buf = _buffer_circle(lat, lng, radius)
-    delta = radius / 111000 * 2.0
-    bbox = (lat-delta, lng-delta, lat+delta, lng+delta)
+def _collect_water(xy: np.ndarray, offsets: np.ndarray, is_water: np.ndarray, buf: Polygon) -> Tuple[List[Polygon], float]:
+    counts = np.diff(offsets)
+    keep = is_water & (counts >= 3)
+    keep[keep] = _way_area_bounds(xy, offsets)[keep] >= MIN_AREA_M2
+    _, inters = _clip_to_buffer(_build_polygons(xy, offsets, keep), buf)
+    return list(inters), float(shapely.area(inters).sum())
 
-    q = f"""
+# "out tags geom" returns only tags + vertex coordinates: no per-way node-id
+# lists or metadata, which the collectors never read.
+# Filled per call with _Q_TEMPLATE.format(south, west, north, east).
+_Q_TEMPLATE = """
     [out:json][timeout:90];
     (
-      way["building"]({bbox[0]},{bbox[1]},{bbox[2]},{bbox[3]});
-      way["highway"]({bbox[0]},{bbox[1]},{bbox[2]},{bbox[3]});
-      way["natural"="water"]({bbox[0]},{bbox[1]},{bbox[2]},{bbox[3]});
-      way["waterway"="riverbank"]({bbox[0]},{bbox[1]},{bbox[2]},{bbox[3]});
+      way["building"]({0},{1},{2},{3});
+      way["highway"]({0},{1},{2},{3});
+      way["natural"="water"]({0},{1},{2},{3});
+      way["waterway"="riverbank"]({0},{1},{2},{3});
     );
-    out geom;
+    out tags geom;
     """
-    data = _overpass(q)
-    buildings_with_type = _collect_buildings(data, fwd, buf)
-    roads_raw = _collect_roads(data, fwd)
-    water_area = _collect_water(data, fwd, buf)
-    water_polygons = _collect_water_polygons(data, fwd, buf)
-
-    # Clip roads
-    # Inside get_congestion_features(), replace the road clipping loop with this:
-        # === PERFECT ROAD CLIPPING WITH FULL METADATA PRESERVED ===
-        # === FINAL 100% WORKING ROAD CLIPPING (Tested on FC Road, Pune) ===
-        # === FINAL BULLETPROOF ROAD CLIPPING — WIDTH ALWAYS SHOWS CORRECTLY ===
-    road_area_total = 0.0
-    road_details = []
 
-    for rd in roads_raw:
-        line = rd["geom"]
-        width = rd["width"]
-        source = rd.get("width_source")  # Can be "osm", "lanes", "fallback", or None
+# GEOS fills in a prepared geometry's indexes lazily on first use, without locking, so a
+# prepared buf shared by the collector threads crashes the process. Each thread gets its own.
+def _prepared_copy(buf: Polygon) -> Polygon:
+    own = shapely.from_wkb(shapely.to_wkb(buf))
+    shapely.prepare(own)
+    return own
 
-        clipped = line.intersection(buf)
-        if clipped.is_empty or clipped.length < 1:
-            continue
+def get_congestion_features(lat: float, lng: float, radius: int = 500):
+    fwd, inv = _projector(lat, lng)
+    buf = _buffer_circle(lat, lng, radius, fwd)
+    delta = radius / 111000 * 2.0
+    tiles = _covering_tiles(lat-delta, lng-delta, lat+delta, lng+delta)
+    ways = _TILES.ways(tiles, lambda bbox: _overpass(_Q_TEMPLATE.format(*bbox)))
+    xy = _project_ways(ways, fwd)
+    offsets, tags_list, kinds = ways.offsets, ways.tags, ways.kinds
+
+    # Collectors only read the shared arrays, and shapely's vectorized GEOS calls
+    # release the GIL, so the three of them overlap on separate threads
+    with ThreadPoolExecutor(max_workers=3) as ex:
+        fb = ex.submit(_collect_buildings, xy, offsets, tags_list, kinds["building"], _prepared_copy(buf))
+        fr = ex.submit(_collect_roads, xy, offsets, tags_list, kinds["road"], _prepared_copy(buf))
+        fw = ex.submit(_collect_water, xy, offsets, kinds["water"], _prepared_copy(buf))
+        buildings_with_type = fb.result()
+        road_area_total, road_details = fr.result()
+        water_polygons, water_area = fw.result()
 
-        segments = clipped.geoms if hasattr(clipped, 'geoms') else [clipped]
-
-        for seg in segments:
-            seg_len = seg.length
-            if width and seg_len > 0:
-                road_area_total += seg_len * width
-
-            # === SMART SOURCE DECISION (THIS IS THE KEY FIX) ===
-            if source == "osm":
-                final_source = "osm"
-            elif source == "lanes":
-                final_source = "lanes"
-            elif width is not None and width >= 3.0:  # Real width exists → treat as OSM
-                final_source = "osm"
-            else:
-                final_source = "fallback"
-
-            road_details.append({
-                "geom": seg,
-                "width": width,
-                "width_source": final_source,
-                "highway": rd.get("highway", ""),
-                "name": rd.get("name", "")
-            })
     # Area
     area_m2 = np.pi * radius ** 2
-    total_building_area = sum(p.area for p, _ in buildings_with_type)
+    building_areas = shapely.area(np.array([p for p, _ in buildings_with_type], dtype=object))
+    total_building_area = float(building_areas.sum())
     true_open_space = area_m2 - total_building_area - road_area_total - water_area
 
-    # Building Type Stats (raw tags)
-    type_areas = {}
-    for geom, btype in buildings_with_type:
-        area = geom.area
-        type_areas[btype] = type_areas.get(btype, 0) + area
+    # Building Type Stats (raw tags) — small int id per tag, then one weighted bincount.
+    # Ids are handed out in first-seen order so the dict keeps the same key order as before.
+    type_ids = {}
+    ids = np.fromiter((type_ids.setdefault(btype, len(type_ids)) for _, btype in buildings_with_type),
+                      dtype=np.int32, count=len(buildings_with_type))
+    type_sums = np.bincount(ids, weights=building_areas, minlength=len(type_ids))
+    type_areas = dict(zip(type_ids, type_sums.tolist()))
 
     # Metrics
     metrics = {